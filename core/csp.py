@@ -1,23 +1,38 @@
 """
 Core Sudoku CSP Solver
 Implements backtracking search with:
+- AC-3 (Arc Consistency) preprocessing
 - MRV (Minimum Remaining Values) heuristic
 - LCV (Least Constraining Value) heuristic
 - Forward Checking constraint propagation
 """
 
+from collections import deque
+from functools import lru_cache
+from math import isqrt
+
 import numpy as np
 
+from .csp_fast import _solve
+
 
 class SudokuCSP:
     """
     Constraint Satisfaction Problem solver for Sudoku.
     
-    Variables: Empty cells represented as (row, col) tuples
-    Domains: Numbers 1-9 for each empty cell
+    Variables: Empty cells represented as flat cell ids (row * size + col)
+    Domains: Numbers 1-9 for each empty cell, stored as 9-bit masks
     Constraints: No duplicates in row, column, or 3x3 box
     """
     
+    __slots__ = ('size', 'box_size', 'full_mask', 'value_bits', 'initial_board',
+                 'units', 'peers', 'unit_lists', 'peer_lists', 'cell_units',
+                 'assignment_arr', 'variables', 'domains_arr', 'size_buckets',
+                 'trail', 'nodes', 'backtracks', 'solutions')
+    
+    # Units and peers tables, built once per board size
+    _tables = {}
+    
     def __init__(self, size=9, initial_board=None):
         """
         Initialize Sudoku CSP solver.
@@ -27,11 +42,9 @@ class SudokuCSP:
             initial_board: 2D list with 0 for empty cells, 1-9 for filled cells
         """
         self.size = size
-        self.box_size = int(np.sqrt(size))  # 3 for 9x9 Sudoku
-        
-        # Variables are (row, col) tuples for empty cells
-        self.variables = []
-        self.initial_domains = {}
+        self.box_size = isqrt(size)  # 3 for 9x9 Sudoku
+        self.full_mask = (1 << size) - 1  # 0x1FF for 9x9 Sudoku
+        self.value_bits = 1 << np.arange(size, dtype=np.uint16)  # bit of each value 1..size
         
         # Initialize board
         if initial_board is None:
@@ -39,37 +52,141 @@ class SudokuCSP:
         else:
             self.initial_board = [row[:] for row in initial_board]
         
-        # Set up variables and domains
-        for r in range(size):
-            for c in range(size):
-                if self.initial_board[r][c] == 0:
-                    self.variables.append((r, c))
-                    self.initial_domains[(r, c)] = list(range(1, size + 1))
+        # Units (rows, columns, boxes) and peers by cell id
+        (self.units, self.peers,
+         self.unit_lists, self.peer_lists, self.cell_units) = self._build_tables(size)
+        
+        # Assignment holds the value of every cell by id, 0 for unassigned
+        self.assignment_arr = np.array(self.initial_board, dtype=np.uint8).reshape(-1)
+        
+        # Variables are the ids of empty cells
+        self.variables = np.flatnonzero(self.assignment_arr == 0).astype(np.int32)
+        
+        # Domains are bitmasks indexed by cell id: bit v-1 set means v is still possible.
+        # Filled cells have an empty mask since they are not variables.
+        # They only depend on the board, so they are computed once per board and copied.
+        board_key = tuple(tuple(row) for row in self.initial_board)
+        self.domains_arr = _initial_domains_for(board_key).copy()
         
-        # Remove values that conflict with initial assignments
-        for r in range(size):
-            for c in range(size):
-                if self.initial_board[r][c] != 0:
-                    val = self.initial_board[r][c]
-                    self._remove_conflicts(r, c, val, self.initial_domains)
+        # Undo log reused by every search started from the initial state
+        self.trail = []
         
         self.reset()
     
-    def _remove_conflicts(self, row, col, value, domains):
+    @classmethod
+    def _build_tables(cls, size):
+        """
+        Build the units and peers tables for a board size, cached per size.
+        
+        Args:
+            size: Board size
+            
+        Returns:
+            (units, peers, unit_lists, peer_lists, cell_units) tuple where:
+                - units is an int32 array of shape (3 * size, size) holding
+                  the cell ids of every row, column and box
+                - peers is an int32 array of shape (size * size, n_peers) holding
+                  the cell ids sharing a unit with each cell
+                - unit_lists and peer_lists are the same tables as nested
+                  Python lists for scalar loops
+                - cell_units lists the indices of the 3 units containing each cell
+        """
+        if size in cls._tables:
+            return cls._tables[size]
+        
+        bs = isqrt(size)
+        rows = [[r * size + c for c in range(size)] for r in range(size)]
+        cols = [[r * size + c for r in range(size)] for c in range(size)]
+        boxes = [[r * size + c
+                  for r in range(br, br + bs)
+                  for c in range(bc, bc + bs)]
+                 for br in range(0, size, bs)
+                 for bc in range(0, size, bs)]
+        units = rows + cols + boxes
+        
+        peer_sets = [set() for _ in range(size * size)]
+        cell_units = [[] for _ in range(size * size)]
+        for u, unit in enumerate(units):
+            for cell in unit:
+                peer_sets[cell].update(unit)
+                cell_units[cell].append(u)
+        for cell in range(size * size):
+            peer_sets[cell].discard(cell)
+        
+        peer_lists = [sorted(p) for p in peer_sets]
+        cls._tables[size] = (np.array(units, dtype=np.int32),
+                             np.array(peer_lists, dtype=np.int32),
+                             units, peer_lists, cell_units)
+        return cls._tables[size]
+    
+    @staticmethod
+    def _mask_values(mask):
+        """
+        List the values contained in a domain bitmask, in increasing order.
+        
+        Args:
+            mask: Domain bitmask (bit v-1 set means v is possible)
+            
+        Returns:
+            List of values
+        """
+        mask = int(mask)
+        values = []
+        while mask:
+            low = mask & -mask
+            values.append(low.bit_length())
+            mask ^= low
+        return values
+    
+    @staticmethod
+    def _remove_conflicts(cell, value, domains, peer_lists):
         """
         Remove value from domains of cells in same row, column, and box.
         
         Args:
-            row: Row index
-            col: Column index
+            cell: Cell id
             value: Value to remove
-            domains: Domain dictionary to update
+            domains: Domain bitmask array to update
+            peer_lists: Peer cell ids of every cell
+        """
+        keep = 0xFFFF ^ (1 << (value - 1))
+        for p in peer_lists[cell]:
+            domains[p] &= keep
+    
+    @staticmethod
+    def _ac3(domains, variables, peer_lists):
+        """
+        Enforce arc consistency between empty cells with AC-3.
+        Under the all-different constraint, a value v of xi has no support in xj
+        only when the domain of xj is exactly {v}.
+        
+        Args:
+            domains: Domain bitmask array to update in place
+            variables: Cell ids of empty cells
+            peer_lists: Peer cell ids of every cell
+            
+        Returns:
+            False if some domain was wiped out, True otherwise
         """
-        for (r, c) in list(domains.keys()):
-            if r == row or c == col or (r // self.box_size == row // self.box_size and 
-                                        c // self.box_size == col // self.box_size):
-                if value in domains[(r, c)]:
-                    domains[(r, c)].remove(value)
+        doms = domains.tolist()
+        queue = deque((xi, xj) for xi in variables
+                      for xj in peer_lists[xi] if doms[xj])
+        
+        consistent = True
+        while queue:
+            xi, xj = queue.popleft()
+            mask_j = doms[xj]
+            # Revise: remove the value of a single-valued xj from xi
+            if mask_j & (mask_j - 1) or not doms[xi] & mask_j:
+                continue
+            doms[xi] ^= mask_j
+            if not doms[xi]:
+                consistent = False
+                break
+            queue.extend((xk, xi) for xk in peer_lists[xi] if xk != xj and doms[xk])
+        
+        domains[:] = doms
+        return consistent
     
     def reset(self):
         """Reset solver statistics"""
@@ -77,54 +194,112 @@ class SudokuCSP:
         self.backtracks = 0
         self.solutions = 0
     
+    def count_solutions(self, limit=2):
+        """
+        Count solutions without emitting search events, stopping at limit.
+        Runs the compiled search from csp_fast, so no statistics are updated.
+        
+        Args:
+            limit: Maximum number of solutions to look for
+            
+        Returns:
+            Number of solutions found (at most limit)
+        """
+        n_assigned = self.size * self.size - len(self.variables)
+        return int(_solve(self.domains_arr.copy(), self.peers,
+                          self.assignment_arr.copy(), n_assigned, limit))
+    
+    def has_multiple_solutions(self):
+        """
+        Check whether the puzzle has more than one solution, stopping the
+        search as soon as a second one is found.
+        
+        Returns:
+            True if at least two solutions exist, False otherwise
+        """
+        return self.count_solutions(2) > 1
+    
+    def solve_fast(self):
+        """
+        Solve the puzzle without emitting search events.
+        
+        Returns:
+            Solved board as a 2D list, or None if the puzzle has no solution
+        """
+        n_assigned = self.size * self.size - len(self.variables)
+        assignment = self.assignment_arr.copy()
+        if _solve(self.domains_arr.copy(), self.peers, assignment, n_assigned, 1) == 0:
+            return None
+        return assignment.reshape(self.size, self.size).tolist()
+    
     def is_consistent(self, var, value, assignment):
         """
         Check if assigning value to var is consistent with current assignment.
         
         Args:
-            var: Variable (row, col) tuple
+            var: Variable cell id
             value: Value to assign
-            assignment: Current assignment dictionary
+            assignment: Current assignment array
             
         Returns:
             True if consistent, False otherwise
         """
-        row, col = var
-        
-        # Check row constraint
-        for c in range(self.size):
-            if (row, c) in assignment and assignment[(row, c)] == value:
+        # Check row, column and box constraints
+        for p in self.peer_lists[var]:
+            if assignment[p] == value:
                 return False
         
-        # Check column constraint
-        for r in range(self.size):
-            if (r, col) in assignment and assignment[(r, col)] == value:
-                return False
+        return True
+    
+    def _init_buckets(self, domains, assignment):
+        """
+        Group unassigned variables by domain size for incremental MRV.
         
-        # Check box constraint
-        box_row = (row // self.box_size) * self.box_size
-        box_col = (col // self.box_size) * self.box_size
-        for r in range(box_row, box_row + self.box_size):
-            for c in range(box_col, box_col + self.box_size):
-                if (r, c) in assignment and assignment[(r, c)] == value:
-                    return False
+        Args:
+            domains: Current domain bitmask array
+            assignment: Current assignment array
+        """
+        self.size_buckets = [set() for _ in range(self.size + 1)]
+        unassigned = self.variables[assignment[self.variables] == 0]
+        sizes = np.bitwise_count(domains[unassigned])
+        for var, n in zip(unassigned.tolist(), sizes.tolist()):
+            self.size_buckets[n].add(var)
+    
+    def _undo(self, domains, trail, mark):
+        """
+        Undo domain removals recorded on the trail since mark.
         
-        return True
+        Args:
+            domains: Domain bitmask array to restore in place
+            trail: Undo log of (cell id, removed bits) pairs
+            mark: Trail length to roll back to
+        """
+        buckets = self.size_buckets
+        while len(trail) > mark:
+            p, bits = trail.pop()
+            mask = int(domains[p])
+            buckets[mask.bit_count()].discard(p)
+            mask |= bits
+            domains[p] = mask
+            buckets[mask.bit_count()].add(p)
     
     def select_unassigned_var(self, domains, assignment):
         """
         Select next variable using MRV (Minimum Remaining Values) heuristic.
-        Ties broken by degree (most constraining variable).
+        Domain sizes are tracked incrementally in size buckets, so this is
+        a lookup of the lowest non-empty bucket rather than a scan.
         
         Args:
-            domains: Current domain dictionary
-            assignment: Current assignment dictionary
+            domains: Current domain bitmask array
+            assignment: Current assignment array
             
         Returns:
-            Variable (row, col) tuple with smallest domain
+            Variable cell id with smallest domain, or None if all are assigned
         """
-        unassigned = [v for v in self.variables if v not in assignment]
-        return min(unassigned, key=lambda v: (len(domains[v]), -self._count_constraints(v, assignment)))
+        for bucket in self.size_buckets:
+            if bucket:
+                return next(iter(bucket))
+        return None
     
     def _count_constraints(self, var, assignment):
         """
@@ -132,19 +307,16 @@ class SudokuCSP:
         Used for degree heuristic tie-breaking.
         
         Args:
-            var: Variable (row, col) tuple
-            assignment: Current assignment dictionary
+            var: Variable cell id
+            assignment: Current assignment array
             
         Returns:
             Number of constraints
         """
-        row, col = var
         count = 0
-        for (r, c) in self.variables:
-            if (r, c) not in assignment and (r, c) != var:
-                if r == row or c == col or (r // self.box_size == row // self.box_size and 
-                                            c // self.box_size == col // self.box_size):
-                    count += 1
+        for p in self.peer_lists[var]:
+            if not assignment[p]:
+                count += 1
         return count
     
     def order_domain_values(self, var, domains, assignment):
@@ -153,128 +325,280 @@ class SudokuCSP:
         Values that rule out fewer choices for neighbors are tried first.
         
         Args:
-            var: Variable (row, col) tuple
-            domains: Current domain dictionary
-            assignment: Current assignment dictionary
+            var: Variable cell id
+            domains: Current domain bitmask array
+            assignment: Current assignment array
             
         Returns:
             Ordered list of values to try
         """
-        def eliminated_count(value):
-            count = 0
-            row, col = var
-            for (r, c) in self.variables:
-                if (r, c) == var or (r, c) in assignment:
-                    continue
-                if (r == row or c == col or (r // self.box_size == row // self.box_size and 
-                                             c // self.box_size == col // self.box_size)):
-                    if value in domains[(r, c)]:
-                        count += 1
-            return count
-        
-        values = list(domains[var])
-        values.sort(key=eliminated_count)
-        return values
+        # Count, for every value, the neighbours still holding it (one row per
+        # value, one column per peer). Assigned and filled peers never hold a
+        # candidate of var, so only unassigned neighbours are counted.
+        peer_masks = domains[self.peers[var]]
+        eliminated_count = np.count_nonzero(peer_masks & self.value_bits[:, None], axis=1)
+        
+        # Least constraining first, keeping only values still in var's domain
+        order = np.argsort(eliminated_count, kind='stable')
+        order = order[(domains[var] & self.value_bits[order]) != 0]
+        return (order + 1).tolist()
     
-    def forward_check(self, var, value, domains):
+    def forward_check(self, var, value, domains, trail):
         """
-        Apply forward checking: remove inconsistent values from neighboring domains.
+        Apply forward checking: remove inconsistent values from neighboring domains,
+        then propagate constraints until nothing changes:
+        - a cell reduced to a single value has that value removed from its peers
+        - a value with a single possible cell in a unit is narrowed to that cell
+        Domains are updated in place and every removal is recorded on the trail,
+        so the caller can roll back with _undo whether or not this succeeds.
+        The domain of var itself is narrowed to value and left for the caller to restore.
         
         Args:
-            var: Variable (row, col) tuple
+            var: Variable cell id
             value: Value being assigned
-            domains: Current domain dictionary
+            domains: Current domain bitmask array
+            trail: Undo log of (cell id, removed bits) pairs
             
         Returns:
-            (new_domains, removed) tuple where:
-                - new_domains is updated domains dict (or None if failure)
-                - removed is dict of values removed from each domain
+            True if no domain was wiped out, False otherwise
         """
-        new_domains = {v: list(domains[v]) for v in domains}
-        removed = {v: [] for v in domains}
-        new_domains[var] = [value]
+        buckets = self.size_buckets
+        peer_lists = self.peer_lists
+        unit_lists = self.unit_lists
+        cell_units = self.cell_units
+        domains[var] = 1 << (value - 1)
         
-        row, col = var
+        singles = [var]
+        touched = set()
+        while singles or touched:
+            # Remove the value of every single-valued cell from its peers
+            while singles:
+                cell = singles.pop()
+                bit = int(domains[cell])
+                for p in peer_lists[cell]:
+                    mask = int(domains[p])
+                    if mask & bit:
+                        mask ^= bit
+                        domains[p] = mask
+                        trail.append((p, bit))
+                        
+                        # Move the peer down one size bucket
+                        n = mask.bit_count()
+                        buckets[n + 1].discard(p)
+                        buckets[n].add(p)
+                        
+                        # If domain becomes empty, forward checking fails
+                        if not mask:
+                            return False
+                        if n == 1:
+                            singles.append(p)
+                        touched.update(cell_units[p])
+            
+            # Narrow cells holding the only place left for a value in a unit
+            while touched and not singles:
+                unit = unit_lists[touched.pop()]
+                once = twice = 0
+                for c in unit:
+                    mask = int(domains[c])
+                    twice |= once & mask
+                    once |= mask
+                only = once & ~twice
+                if not only:
+                    continue
+                for c in unit:
+                    mask = int(domains[c])
+                    bit = mask & only
+                    if bit and mask != bit:
+                        # Two values pinned to the same cell cannot both hold
+                        if bit & (bit - 1):
+                            return False
+                        domains[c] = bit
+                        trail.append((c, mask ^ bit))
+                        buckets[mask.bit_count()].discard(c)
+                        buckets[1].add(c)
+                        singles.append(c)
         
-        # Remove value from all cells in same row, column, and box
-        for (r, c) in self.variables:
-            if (r, c) == var:
-                continue
+        return True
+    
+    def solve(self):
+        """
+        Solve the puzzle with the same search as backtrack_generator,
+        without yielding events. Statistics are updated as usual.
+        
+        Returns:
+            Solved board as a 2D list, or None if the puzzle has no solution
+        """
+        domains = self.domains_arr.copy()
+        assignment = self.assignment_arr.copy()
+        self._init_buckets(domains, assignment)
+        self.trail.clear()
+        if not self._search_silent(domains, assignment, self.trail, 1):
+            return None
+        return assignment.reshape(self.size, self.size).tolist()
+    
+    def _search_silent(self, domains, assignment, trail, limit):
+        """
+        Backtracking search without events, stopping after limit solutions.
+        
+        Args:
+            domains: Current domain bitmask array, updated in place
+            assignment: Current assignment array, updated in place
+            trail: Undo log shared across the search
+            limit: Maximum number of solutions to look for
+            
+        Returns:
+            Number of solutions found (at most limit). When it equals limit,
+            assignment holds the last solution found.
+        """
+        self.nodes += 1
+        
+        # Select unassigned variable using MRV
+        var = self.select_unassigned_var(domains, assignment)
+        
+        # Check if all variables are assigned
+        if var is None:
+            self.solutions += 1
+            return 1
+        
+        # Take var out of the MRV buckets while it is being assigned
+        var_mask = domains[var]
+        var_bucket = self.size_buckets[int(var_mask).bit_count()]
+        var_bucket.discard(var)
+        
+        # Forward checking keeps every domain consistent with the assignment,
+        # so no consistency check is needed before assigning
+        count = 0
+        for value in self.order_domain_values(var, domains, assignment):
+            assignment[var] = value
+            mark = len(trail)
+            if self.forward_check(var, value, domains, trail):
+                count += self._search_silent(domains, assignment, trail, limit - count)
+                if count >= limit:
+                    return count
             
-            if r == row or c == col or (r // self.box_size == row // self.box_size and 
-                                        c // self.box_size == col // self.box_size):
-                if value in new_domains[(r, c)]:
-                    new_domains[(r, c)].remove(value)
-                    removed[(r, c)].append(value)
-                
-                # If domain becomes empty, forward checking fails
-                if not new_domains[(r, c)]:
-                    return None, removed
-        
-        return new_domains, removed
+            # Backtrack
+            self._undo(domains, trail, mark)
+            assignment[var] = 0
+            self.backtracks += 1
+        
+        domains[var] = var_mask
+        var_bucket.add(var)
+        return count
     
-    def backtrack_generator(self, domains=None, assignment=None):
+    def backtrack_generator(self, domains=None, assignment=None, trail=None):
         """
         Backtracking search with generator for step-by-step visualization.
         Yields events that can be consumed by the GUI for visualization.
         
         Args:
-            domains: Current domain dictionary (or None to use initial)
-            assignment: Current assignment dictionary (or None for empty)
+            domains: Current domain bitmask array, updated in place (or None to use initial)
+            assignment: Current assignment array, updated in place (or None to use initial)
+            trail: Undo log shared across the search (or None to reuse self.trail)
             
         Yields:
             Tuples representing events: ('event_type', data...)
+            Assignment changes are yielded as deltas ('assign', var, value) and
+            ('unassign', var); a single ('snapshot', assignment) event is yielded
+            first when the search starts from the initial assignment.
         """
         if domains is None:
-            domains = {v: list(self.initial_domains[v]) for v in self.variables}
+            domains = self.domains_arr.copy()
         if assignment is None:
-            assignment = {}
+            assignment = self.assignment_arr.copy()
+            self._init_buckets(domains, assignment)
+            yield ('snapshot', assignment.copy())
+        if trail is None:
+            trail = self.trail
+            trail.clear()
         
         self.nodes += 1
         
+        # Select unassigned variable using MRV
+        var = self.select_unassigned_var(domains, assignment)
+        
         # Check if all variables are assigned
-        if len(assignment) == len(self.variables):
+        if var is None:
             self.solutions += 1
-            yield ('solution', dict(assignment))
+            yield ('solution', assignment.copy())
             return
         
-        # Select unassigned variable using MRV
-        var = self.select_unassigned_var(domains, assignment)
-        yield ('mrv', var, domains[var])
+        yield ('mrv', var, self._mask_values(domains[var]))
         
         # Order domain values using LCV
         lcv_order = self.order_domain_values(var, domains, assignment)
         yield ('lcv', var, lcv_order)
         
+        # Take var out of the MRV buckets while it is being assigned
+        var_mask = domains[var]
+        var_bucket = self.size_buckets[int(var_mask).bit_count()]
+        var_bucket.discard(var)
+        
         # Try each value in order
         for value in lcv_order:
-            # Check consistency
+            # Check consistency (redundant under forward checking, kept so
+            # the visualization can show pruned values)
             if not self.is_consistent(var, value, assignment):
                 yield ('pruned', var, value)
                 continue
             
             # Assign value
             assignment[var] = value
-            yield ('assign', var, value, dict(assignment))
+            yield ('assign', var, value)
             
             # Forward checking
-            fc = self.forward_check(var, value, domains)
-            if fc[0] is None:
+            mark = len(trail)
+            ok = self.forward_check(var, value, domains, trail)
+            removed = [p for p, _ in trail[mark:]]
+            if not ok:
                 # Forward checking failed - domain wipeout
-                yield ('fc_fail', var, value, fc[1])
-                del assignment[var]
+                yield ('fc_fail', var, value, removed)
+                self._undo(domains, trail, mark)
+                assignment[var] = 0
                 self.backtracks += 1
-                yield ('unassign', var, dict(assignment))
+                yield ('unassign', var)
                 continue
             
-            new_domains, removed = fc
             yield ('fc_ok', var, value, removed)
             
             # Recursively solve
-            for e in self.backtrack_generator(new_domains, assignment):
+            for e in self.backtrack_generator(domains, assignment, trail):
                 yield e
             
             # Backtrack
-            del assignment[var]
+            self._undo(domains, trail, mark)
+            assignment[var] = 0
             self.backtracks += 1
-            yield ('unassign', var, dict(assignment))
\ No newline at end of file
+            yield ('unassign', var)
+        
+        domains[var] = var_mask
+        var_bucket.add(var)
+
+
+@lru_cache(maxsize=128)
+def _initial_domains_for(board_key):
+    """
+    Compute the initial domains of a board, cached across SudokuCSP instances.
+    
+    Args:
+        board_key: Board as a tuple of row tuples, 0 for empty cells
+        
+    Returns:
+        Read-only uint16 domain bitmask array indexed by cell id
+    """
+    size = len(board_key)
+    peer_lists = SudokuCSP._build_tables(size)[3]
+    board = np.array(board_key, dtype=np.uint8).reshape(-1)
+    variables = np.flatnonzero(board == 0)
+    
+    domains = np.zeros(size * size, dtype=np.uint16)
+    domains[variables] = (1 << size) - 1
+    
+    # Remove values that conflict with initial assignments
+    for cell in np.flatnonzero(board).tolist():
+        SudokuCSP._remove_conflicts(cell, int(board[cell]), domains, peer_lists)
+    
+    # Make every arc between empty cells consistent before searching
+    SudokuCSP._ac3(domains, variables.tolist(), peer_lists)
+    
+    domains.flags.writeable = False
+    return domains
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Fast Sudoku CSP Solver
+Numba-compiled backtracking search behind SudokuCSP.solve_fast and
+SudokuCSP.count_solutions, for callers that only need results, not
+per-step events (puzzle generation and uniqueness checks):
+- MRV (Minimum Remaining Values) heuristic
+- Forward Checking on uint16 domain bitmasks with a fixed-size undo trail
+"""
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _popcount(mask):
+    """Count the set bits of a domain bitmask."""
+    n = 0
+    while mask:
+        mask &= mask - 1
+        n += 1
+    return n
+
+
+@njit(cache=True)
+def _bit_value(bit):
+    """Convert a single-bit mask to the value it represents."""
+    value = 0
+    while bit:
+        bit >>= 1
+        value += 1
+    return value
+
+
+@njit(cache=True)
+def _select(domains, assignment):
+    """Return the unassigned cell with the smallest domain (MRV)."""
+    best = -1
+    best_n = 99
+    for i in range(domains.shape[0]):
+        if assignment[i] == 0:
+            n = _popcount(np.int64(domains[i]))
+            if n < best_n:
+                best = i
+                best_n = n
+                if n <= 1:
+                    break
+    return best
+
+
+@njit(cache=True)
+def _undo(domains, trail_cell, trail_bits, top, mark):
+    """Restore removals recorded on the trail above mark."""
+    while top > mark:
+        top -= 1
+        domains[trail_cell[top]] |= trail_bits[top]
+    return top
+
+
+@njit(cache=True)
+def _solve(domains, peers, assignment, n_assigned, count_limit):
+    """
+    Count solutions with iterative backtracking search.
+    
+    Args:
+        domains: uint16 domain bitmask per cell, updated in place
+        peers: int32 table of peer cell ids, one row per cell
+        assignment: uint8 value per cell (0 for unassigned), updated in place
+        n_assigned: Number of nonzero entries in assignment
+        count_limit: Stop searching once this many solutions are found
+        
+    Returns:
+        Number of solutions found (at most count_limit). When it equals
+        count_limit, assignment holds the last solution found; otherwise
+        domains and assignment are restored to their initial state.
+    """
+    n_cells = domains.shape[0]
+    if n_assigned == n_cells:
+        return 1
+    
+    # Each trail entry removes at least one of the 16 bits of a cell
+    trail_cell = np.empty(n_cells * 16, dtype=np.int32)
+    trail_bits = np.empty(n_cells * 16, dtype=np.uint16)
+    top = 0
+    
+    # Per-depth search state
+    depth_cell = np.empty(n_cells, dtype=np.int32)
+    depth_mask = np.empty(n_cells, dtype=np.uint16)
+    depth_cands = np.empty(n_cells, dtype=np.uint16)
+    depth_mark = np.empty(n_cells, dtype=np.int32)
+    
+    count = 0
+    depth = 0
+    cell = _select(domains, assignment)
+    depth_cell[0] = cell
+    depth_mask[0] = domains[cell]
+    depth_cands[0] = domains[cell]
+    depth_mark[0] = 0
+    
+    while depth >= 0:
+        cell = depth_cell[depth]
+        top = _undo(domains, trail_cell, trail_bits, top, depth_mark[depth])
+        
+        cands = np.int64(depth_cands[depth])
+        if cands == 0:
+            # Every value failed - backtrack
+            domains[cell] = depth_mask[depth]
+            assignment[cell] = 0
+            depth -= 1
+            continue
+        
+        # Assign the lowest remaining value
+        bit = cands & -cands
+        depth_cands[depth] = cands ^ bit
+        assignment[cell] = _bit_value(bit)
+        domains[cell] = bit
+        
+        # Forward checking
+        ok = True
+        for k in range(peers.shape[1]):
+            p = peers[cell, k]
+            mask = np.int64(domains[p])
+            if mask & bit:
+                mask ^= bit
+                domains[p] = mask
+                trail_cell[top] = p
+                trail_bits[top] = bit
+                top += 1
+                if mask == 0:
+                    ok = False
+                    break
+        if not ok:
+            continue
+        
+        if n_assigned + depth + 1 == n_cells:
+            count += 1
+            if count >= count_limit:
+                return count
+            continue
+        
+        # Descend to the next MRV variable
+        cell = _select(domains, assignment)
+        depth += 1
+        depth_cell[depth] = cell
+        depth_mask[depth] = domains[cell]
+        depth_cands[depth] = domains[cell]
+        depth_mark[depth] = top
+    
+    return count
\ No newline at end of file
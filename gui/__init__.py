@@ -0,0 +1,6 @@
+"""
+GUI support module
+"""
+from .events import AssignmentMirror, to_grid_event
+
+__all__ = ['AssignmentMirror', 'to_grid_event']
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Search event helpers for the GUI
+Rebuilds board state from the compact events of SudokuCSP.backtrack_generator
+and translates their flat cell ids (row * size + col) to grid positions
+"""
+
+
+def to_grid_event(event, size=9):
+    """
+    Translate a search event from flat cell ids to (row, col) positions.
+    
+    Args:
+        event: Event tuple yielded by backtrack_generator
+        size: Board size
+        
+    Returns:
+        Event tuple with cells as (row, col) tuples and boards as 2D lists
+    """
+    kind = event[0]
+    if kind in ('snapshot', 'solution'):
+        return (kind, event[1].reshape(size, size).tolist())
+    
+    var = divmod(event[1], size)
+    if kind in ('fc_ok', 'fc_fail'):
+        return (kind, var, event[2], [divmod(p, size) for p in event[3]])
+    return (kind, var) + tuple(event[2:])
+
+
+class AssignmentMirror:
+    """
+    Mirror of the solver's assignment, kept up to date from search events.
+    
+    The generator only yields deltas for assignments, so the GUI applies
+    each event here instead of receiving a full copy on every step.
+    """
+    
+    def __init__(self):
+        """Initialize an empty mirror (filled by the first 'snapshot' event)."""
+        self.assignment = None
+    
+    def update(self, event):
+        """
+        Apply a search event to the mirrored assignment.
+        
+        Args:
+            event: Event tuple yielded by backtrack_generator
+            
+        Returns:
+            Current assignment array (value per cell id, 0 for unassigned)
+        """
+        kind = event[0]
+        if kind == 'snapshot':
+            self.assignment = event[1].copy()
+        elif kind == 'assign':
+            self.assignment[event[1]] = event[2]
+        elif kind == 'unassign':
+            self.assignment[event[1]] = 0
+        return self.assignment
\ No newline at end of file
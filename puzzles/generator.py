@@ -3,15 +3,84 @@ Sudoku puzzle generator
 Creates random solvable puzzles of varying difficulty
 """
 
+import random
+from math import isqrt
+
 import numpy as np
 from core.csp import SudokuCSP
 
 
-def generate_puzzle(size=9, difficulty='Easy'):
+def generate_puzzle(size=9, difficulty='Easy', use_solver=False):
     """
     Generate a random solvable Sudoku puzzle.
+    
+    The solved grid is a shuffled canonical grid by default; use_solver=True
+    completes randomly seeded diagonal boxes with the solver instead.
+    """
+    if use_solver:
+        board = _solve_seeded_grid(size)
+    else:
+        board = _shuffled_grid(size)
+    
+    if board:
+        # Remove numbers based on difficulty
+        cells_to_remove = _get_cells_to_remove(difficulty, size)
+        
+        cells = [(r, c) for r in range(size) for c in range(size)]
+        random.shuffle(cells)
+        
+        for i in range(min(cells_to_remove, len(cells))):
+            r, c = cells[i]
+            board[r][c] = 0
+    
+    return board
+
+
+def _canonical_grid(size):
+    """
+    Build a fixed solved grid: each row is the first one shifted by a box
+    width, and each band by one more cell.
+    
+    Returns: 2D uint8 array
+    """
+    box_size = isqrt(size)
+    r = np.arange(size)[:, None]
+    c = np.arange(size)[None, :]
+    return ((box_size * (r % box_size) + r // box_size + c) % size + 1).astype(np.uint8)
+
+
+def _shuffled_grid(size):
+    """
+    Randomize the canonical grid with symmetries that keep it solved:
+    digit relabeling, rows within bands, columns within stacks, and the
+    order of bands and stacks.
+    
+    Returns: solved board as a 2D list
+    """
+    box_size = isqrt(size)
+    
+    # relabel digits
+    digits = np.array(random.sample(range(1, size + 1), size), dtype=np.uint8)
+    grid = digits[_canonical_grid(size) - 1]
+    
+    # shuffle bands, then rows inside each band (same for stacks and columns)
+    rows = [band * box_size + r
+            for band in random.sample(range(box_size), box_size)
+            for r in random.sample(range(box_size), box_size)]
+    cols = [stack * box_size + c
+            for stack in random.sample(range(box_size), box_size)
+            for c in random.sample(range(box_size), box_size)]
+    
+    return grid[rows][:, cols].tolist()
+
+
+def _solve_seeded_grid(size):
+    """
+    Fill the diagonal boxes at random and complete the grid with the solver.
+    
+    Returns: solved board as a 2D list, or None if it could not be completed
     """
-    box_size = int(np.sqrt(size))
+    box_size = isqrt(size)
     
     # empty board for the start
     board = [[0 for _ in range(size)] for _ in range(size)]
@@ -19,39 +88,14 @@ def generate_puzzle(size=9, difficulty='Easy'):
     # diagonal boxes first
     for box_num in range(box_size):
         nums = list(range(1, size + 1))
-        np.random.shuffle(nums)
+        random.shuffle(nums)
         idx = 0
         for r in range(box_size):
             for c in range(box_size):
                 board[box_num * box_size + r][box_num * box_size + c] = nums[idx]
                 idx += 1
     
-    temp_csp = SudokuCSP(size, board)
-    gen = temp_csp.backtrack_generator()
-    solution = None
-    for event in gen:
-        if event[0] == 'solution':
-            solution = event[1]
-            break
-    
-    if solution:
-        # Create a complete board
-        for r in range(size):
-            for c in range(size):
-                if (r, c) in solution:
-                    board[r][c] = solution[(r, c)]
-        
-        # Remove numbers based on difficulty
-        cells_to_remove = _get_cells_to_remove(difficulty, size)
-        
-        cells = [(r, c) for r in range(size) for c in range(size)]
-        np.random.shuffle(cells)
-        
-        for i in range(min(cells_to_remove, len(cells))):
-            r, c = cells[i]
-            board[r][c] = 0
-    
-    return board
+    return SudokuCSP(size, board).solve_fast()
 
 
 def _get_cells_to_remove(difficulty, size):
@@ -80,15 +124,6 @@ def is_valid_puzzle(board):
     Check if a puzzle is valid (has a unique solution).
     """
     size = len(board)
-    csp = SudokuCSP(size, board)
-    
-    solution_count = 0
-    gen = csp.backtrack_generator()
-    
-    for event in gen:
-        if event[0] == 'solution':
-            solution_count += 1
-            if solution_count > 1:
-                return False  # Multiple solutions
     
-    return solution_count == 1  # one solution
\ No newline at end of file
+    # stop searching as soon as a second solution shows up
+    return SudokuCSP(size, board).count_solutions(2) == 1
\ No newline at end of file